@@ -6,23 +6,19 @@ file according to some conventions.
 # pylint: disable=fixme, too-many-lines
 
 import argparse
+import bisect
 import functools
 import itertools
 import os
 import re
+import stat
 import sys
 import time
 from copy import deepcopy
-from importlib.metadata import version
-from os import listdir
-from os.path import abspath, exists, isdir, isfile, join
+from os.path import abspath, isdir, join
 from typing import Any, Callable, Dict, List, Set, Tuple, Union
 from dataclasses import dataclass
 
-from rich.console import Console
-from rich.table import Table
-import yaml
-
 ###############################################################################
 # Utility
 ###############################################################################
@@ -45,43 +41,45 @@ class Diagnostic:
 
 _VERBOSE = False
 _SILENT = False
-_GAP_KEYWORDS = {
-    "and",
-    "atomic",
-    "break",
-    "continue",
-    "do",
-    "elif",
-    "else",
-    "end",
-    "false",
-    "fi",
-    "for",
-    "function",
-    "if",
-    "in",
-    "local",
-    "mod",
-    "not",
-    "od",
-    "or",
-    "readonly",
-    "readwrite",
-    "rec",
-    "repeat",
-    "return",
-    "then",
-    "true",
-    "until",
-    "while",
-    "quit",
-    "QUIT",
-    "IsBound",
-    "Unbind",
-    "TryNextMethod",
-    "Info",
-    "Assert",
-}
+_GAP_KEYWORDS = frozenset(
+    {
+        "and",
+        "atomic",
+        "break",
+        "continue",
+        "do",
+        "elif",
+        "else",
+        "end",
+        "false",
+        "fi",
+        "for",
+        "function",
+        "if",
+        "in",
+        "local",
+        "mod",
+        "not",
+        "od",
+        "or",
+        "readonly",
+        "readwrite",
+        "rec",
+        "repeat",
+        "return",
+        "then",
+        "true",
+        "until",
+        "while",
+        "quit",
+        "QUIT",
+        "IsBound",
+        "Unbind",
+        "TryNextMethod",
+        "Info",
+        "Assert",
+    }
+)
 
 _DEFAULT_CONFIG = {
     "columns": 80,
@@ -104,7 +102,32 @@ _LINE_SUPPRESSIONS = {}
 _LINE_RULES = []
 _FILE_RULES = []
 
-_ESCAPE_PATTERN = re.compile(r"(^\\(\\\\)*[^\\]+.*$|^\\(\\\\)*$)")
+# Maps the code and the name of every rule to the rule, built in __init_rules.
+_RULES_BY_NAME_OR_CODE = {}
+
+# Pairs consisting of a pattern and a set of line rules, such that the rules in
+# the set cannot warn about a line unless the pattern matches it.
+_LINE_RULE_GROUPS = []
+
+# Matches a comment, or an escaped character, string or char which is skipped
+# so that any '#' it contains is not mistaken for the start of a comment.
+_COMMENT_PATTERN = re.compile(
+    r"""\\[^#]|"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?|(#+)([^\n]*)"""
+)
+_COMMENT_BODY_PATTERN = re.compile(r"[^!\s]")
+_BACKREF_PATTERN = re.compile(r"\\\d")
+_NON_BLANK_PATTERN = re.compile(r"[^\n ]")
+
+# Patterns for finding the rules suppressed in a file, or on one of its lines.
+_COMMENT_LINE_PATTERN = re.compile(r"^\s*($|#)")
+_FILE_SUPPRESSION_PATTERN = re.compile(r"#\s*gaplint:\s*disable\s*=\s*")
+_THIS_LINE_SUPPRESSION_PATTERN = re.compile(r"#\s*gaplint:\s*disable\s*=\s*")
+_NEXT_LINE_SUPPRESSION_PATTERN = re.compile(
+    r"#\s* gaplint:\s*disable\(nextline\)=\s*"
+)
+_RULE_NAMES_PATTERN = re.compile(r"[a-zA-Z0-9_\-]+")
+
+_VALID_EXTENSIONS = (".g", ".g.txt", ".gi", ".gd", ".gap", ".tst", ".xml")
 
 _DIAGNOSTICS = []
 
@@ -113,22 +136,22 @@ _DIAGNOSTICS = []
 ###############################################################################
 
 
+@functools.cache
 def _is_tst_or_xml_file(fname: str) -> bool:
     """Returns True if the extension of fname is '.xml' or '.tst'."""
     assert isinstance(fname, str)
-    ext = fname.split(".")[-1]
-    return ext in ("tst", "xml")
+    return fname.endswith((".tst", ".xml"))
 
 
-def _is_escaped(lines: str, pos: int) -> Union[bool, re.Match, None]:
+def _is_escaped(lines: str, pos: int) -> bool:
     assert isinstance(lines, str)
     assert isinstance(pos, int)
     assert 0 <= pos < len(lines)
-    if lines[pos - 1] != "\\":
-        return False
-    start = lines.rfind("\n", 0, pos)
-    # Search for an odd number of backslashes immediately before line[pos]
-    return _ESCAPE_PATTERN.search(lines[start + 1 : pos][::-1])
+    # Count the backslashes immediately before lines[pos]
+    i = pos - 1
+    while i >= 0 and lines[i] == "\\":
+        i -= 1
+    return (pos - 1 - i) % 2 == 1
 
 
 def _is_double_quote_in_char(line: str, pos: int) -> bool:
@@ -143,12 +166,42 @@ def _is_double_quote_in_char(line: str, pos: int) -> bool:
     )
 
 
-def _is_in_string(lines: str, pos: int) -> bool:
+def _is_word_char(char: str) -> bool:
+    """Returns True if char is matched by the regex \\w."""
+    return char.isalnum() or char == "_"
+
+
+def _is_keyword_at(lines: str, pos: int, keyword: str) -> bool:
+    """
+    Returns True if the word keyword occurs in lines starting at pos, i.e.
+    if the regex \\bkeyword\\b matches at pos.
+    """
     assert isinstance(lines, str)
     assert isinstance(pos, int)
-    start = lines.rfind("\n", 0, pos)
-    line = re.sub(r"\\.", "", lines[start:pos])
-    return line.count('"') % 2 == 1 or line.count("'") % 2 == 1
+    end = pos + len(keyword)
+    return (
+        lines.startswith(keyword, pos)
+        and (pos == 0 or not _is_word_char(lines[pos - 1]))
+        and (end == len(lines) or not _is_word_char(lines[end]))
+    )
+
+
+def _line_starts(lines: str) -> List[int]:
+    """
+    Returns the list of offsets in lines at which the 2nd, 3rd, and so on,
+    lines start, for use with _line_number.
+    """
+    assert isinstance(lines, str)
+    return list(itertools.accumulate(len(x) + 1 for x in lines.split("\n")))
+
+
+def _line_number(line_starts: List[int], pos: int) -> int:
+    """
+    Returns the (0-based) number of the line containing lines[pos], where
+    line_starts = _line_starts(lines). This is the same as
+    lines.count("\n", 0, pos), but takes O(log(n)) rather than O(n) time.
+    """
+    return bisect.bisect_right(line_starts, pos)
 
 
 ###############################################################################
@@ -208,9 +261,12 @@ class Rule:
 
     A rule is a subclass of this class which has a __call__ method that returns
     Tuple[int, str] where the \"int\" is the number of warnings issued, and where
-    the \"str\" is the lines of the file on which the rules are being applied.
+    the \"str\" is the lines of the file on which the rules are being applied
+    (or the single line for a line rule).
     """
 
+    __slots__ = ("name", "code", "desc")
+
     all_codes = set()
     all_names = {}
 
@@ -234,13 +290,14 @@ class Rule:
         assert isinstance(name, str)
         assert isinstance(code, str)
         assert isinstance(desc, str)
-        if __debug__:
-            if code in Rule.all_codes:
-                raise ValueError(f"Duplicate rule code {code}")
-            Rule.all_codes.add(code)
-            if name in Rule.all_names:
-                raise ValueError(f"Duplicate rule name {name}")
-            Rule.all_names[name] = code
+        # The codes and names are recorded even if assertions are disabled
+        # (python -O), since they are used to resolve rule names to codes.
+        if code in Rule.all_codes:
+            raise ValueError(f"Duplicate rule code {code}")
+        Rule.all_codes.add(code)
+        if name in Rule.all_names:
+            raise ValueError(f"Duplicate rule name {name}")
+        Rule.all_names[name] = code
         self.name = name
         self.code = code
         self.desc = desc
@@ -255,6 +312,12 @@ class Rule:
         over into the next file.
         """
 
+    def skip(self, fname: str) -> bool:  # pylint: disable=unused-argument
+        """
+        Returns True if this rule should not be applied to fname.
+        """
+        return False
+
 
 class WarnRegexBase(Rule):
     """
@@ -263,6 +326,15 @@ class WarnRegexBase(Rule):
     exceptions is also matched.
     """
 
+    __slots__ = (
+        "_pattern",
+        "_warning_msg",
+        "_exception_patterns",
+        "_exception_group",
+        "_exceptions",
+        "_skip",
+    )
+
     # TODO use keyword args
     def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments, dangerous-default-value
         self,
@@ -288,21 +360,20 @@ class WarnRegexBase(Rule):
 
     def _match(self, line: str, start: int = 0) -> Union[int, None]:
         exception_group = self._exception_group
-        it = self._pattern.finditer(line, start)
-        for x in it:
-            exception = False
-            if len(self._exceptions) > 0:
-                x_group = x.groups().index(exception_group) + 1
-                for e in self._exceptions:
-                    ite = e.finditer(line)
-                    for m in ite:
-                        m_group = m.groups().index(exception_group) + 1
-                        if m.start(m_group) == x.start(x_group):
-                            exception = True
-                            break
-                    if exception:
-                        break
-            if not exception:
+        exception_starts = None
+        for x in self._pattern.finditer(line, start):
+            if len(self._exceptions) == 0:
+                return x.start()
+            if exception_starts is None:
+                # The start of the exception group in every exception match,
+                # found once per line rather than once per match of pattern.
+                exception_starts = {
+                    m.start(m.groups().index(exception_group) + 1)
+                    for e in self._exceptions
+                    for m in e.finditer(line)
+                }
+            x_group = x.groups().index(exception_group) + 1
+            if x.start(x_group) not in exception_starts:
                 return x.start()
         return None
 
@@ -327,6 +398,8 @@ class ReplaceAnnoyUTF8Chars(Rule):
     currently does not.
     """
 
+    __slots__ = ("_chars", "_pattern")
+
     def __init__(self, name: str, code: str, desc: str = "") -> None:
         Rule.__init__(self, name, code, desc)
         self._chars = {
@@ -353,6 +426,7 @@ class ReplaceAnnoyUTF8Chars(Rule):
             "\xcc\xa8": "",  # modifier - under curve
             "\xcc\xb1": "",  # modifier - under line
         }
+        self._pattern = re.compile("|".join(self._chars))
 
     def __call__(
         self, fname: str, lines: str, nr_warnings: int = 0
@@ -361,18 +435,10 @@ class ReplaceAnnoyUTF8Chars(Rule):
         assert isinstance(lines, str)
         assert isinstance(nr_warnings, int)
 
-        # Remove annoying characters
-        def replace_chars(
-            match: re.Match,
-        ) -> str:
-            char = match.group(0)
-            return self._chars[char]
-
-        return (
-            nr_warnings,
-            re.sub(
-                "(" + "|".join(self._chars.keys()) + ")", replace_chars, lines
-            ),
+        # Remove annoying characters, all in one pass, so that removing one
+        # cannot create another from the characters either side of it.
+        return nr_warnings, self._pattern.sub(
+            lambda match: self._chars[match.group()], lines
         )
 
 
@@ -381,6 +447,8 @@ class WarnRegexFile(WarnRegexBase):
     A rule that issues a warning if a regex is matched in a file.
     """
 
+    __slots__ = ()
+
     def __call__(
         self, fname: str, lines: str, nr_warnings: int = 0
     ) -> Tuple[int, str]:
@@ -390,9 +458,12 @@ class WarnRegexFile(WarnRegexBase):
         if _is_tst_or_xml_file(fname):
             return nr_warnings, lines
 
+        line_starts = None
         match = self._match(lines)
         while match is not None:
-            line_num = lines.count("\n", 0, match)
+            if line_starts is None:
+                line_starts = _line_starts(lines)
+            line_num = _line_number(line_starts, match)
             if not _is_rule_suppressed(fname, line_num + 1, self):
                 _warn(self, fname, line_num, self._warning_msg)
                 nr_warnings += 1
@@ -400,6 +471,52 @@ class WarnRegexFile(WarnRegexBase):
         return nr_warnings, lines
 
 
+@functools.cache
+def _long_line_pattern(cols: int) -> re.Pattern:
+    """
+    Returns the compiled pattern matching the lines that are longer than cols,
+    so that it is compiled at most once for each value of cols.
+    """
+    return re.compile(rf"^.{{{cols + 2},}}", re.MULTILINE)
+
+
+class LineTooLong(Rule):
+    """
+    Warn if the length of a line exceeds 80 characters.
+
+    This rule does not modify the file.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, name: str, code: str, desc: str = "") -> None:
+        Rule.__init__(self, name, code, desc)
+
+    def __call__(
+        self, fname: str, lines: str, nr_warnings: int = 0
+    ) -> Tuple[int, str]:
+        assert isinstance(fname, str)
+        assert isinstance(lines, str)
+        assert isinstance(nr_warnings, int)
+        cols = _GLOB_CONFIG["columns"]
+        if _is_tst_or_xml_file(fname):
+            return nr_warnings, lines
+        # Find all the long lines in one scan of the file, rather than checking
+        # the length of every line separately.
+        line_starts = None
+        for match in _long_line_pattern(cols).finditer(lines):
+            if line_starts is None:
+                line_starts = _line_starts(lines)
+            linenum = _line_number(line_starts, match.start())
+            if not _is_rule_suppressed(fname, linenum + 1, self):
+                length = len(match.group()) - 1
+                _warn(
+                    self, fname, linenum, f"Too long line ({length} / {cols})"
+                )
+                nr_warnings += 1
+        return nr_warnings, lines
+
+
 class ReplaceComments(Rule):
     """
     Replace between '#+' and the end of a line by '#+' and as many '@' as there
@@ -409,28 +526,24 @@ class ReplaceComments(Rule):
     This rule does not return any warnings.
     """
 
+    __slots__ = ()
+
     def __call__(
         self, fname: str, lines: str, nr_warnings: int = 0
     ) -> Tuple[int, str]:
         assert isinstance(fname, str)
         assert isinstance(lines, str)
         assert isinstance(nr_warnings, int)
-        start = lines.find("#", 0)
-        while start != -1 and _is_in_string(lines, start):
-            start = lines.find("#", start + 1)
-        while start != -1:
-            end = lines.find("\n", start)
-            repl = ""
-            octo = start
-            while octo < len(lines) and lines[octo] == "#":
-                repl += "#"
-                octo += 1
-            repl += re.sub(r"[^!\s]", "@", lines[octo:end])
-            lines = lines[:start] + repl + lines[end:]
-            start = lines.find("#", end)
-            while _is_in_string(lines, start):
-                start = lines.find("#", start + 1)
-        return nr_warnings, lines
+        out, end = [], 0
+        for match in _COMMENT_PATTERN.finditer(lines):
+            if match.group(1) is None:
+                continue
+            out.append(lines[end : match.start()])
+            out.append(match.group(1))
+            out.append(_COMMENT_BODY_PATTERN.sub("@", match.group(2)))
+            end = match.end()
+        out.append(lines[end:])
+        return nr_warnings, "".join(out)
 
 
 class ReplaceBetweenDelimiters(Rule):
@@ -441,6 +554,8 @@ class ReplaceBetweenDelimiters(Rule):
     This rule does not return any warnings.
     """
 
+    __slots__ = ("_delims",)
+
     def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
         self, name: str, code: str, desc: str, delim1: str, delim2: str
     ) -> None:
@@ -471,8 +586,10 @@ class ReplaceBetweenDelimiters(Rule):
         assert isinstance(lines, str)
         assert isinstance(nr_warnings, int)
 
+        out, end = [], 0
         start = self.__find_next(0, lines, 0)
         while start != -1:
+            out.append(lines[end:start])
             end = self.__find_next(1, lines, start + 1)
             if end == -1:
                 _error(
@@ -482,12 +599,13 @@ class ReplaceBetweenDelimiters(Rule):
                     f"Unmatched {self._delims[0].pattern}",
                 )
             end += len(self._delims[1].pattern)
-            repl = re.sub("[^\n ]", "@", lines[start:end])
+            repl = _NON_BLANK_PATTERN.sub("@", lines[start:end])
             assert len(repl) == end - start
 
-            lines = lines[:start] + repl + lines[end:]
+            out.append(repl)
             start = self.__find_next(0, lines, end + 1)
-        return nr_warnings, lines
+        out.append(lines[end:])
+        return nr_warnings, "".join(out)
 
 
 class ReplaceOutputTstOrXMLFile(Rule):
@@ -498,12 +616,23 @@ class ReplaceOutputTstOrXMLFile(Rule):
     '@''s.
     """
 
+    __slots__ = ("_consuming", "_sol_p")
+
     def __init__(self, name: str, code: str, desc: str = "") -> None:
         Rule.__init__(self, name, code, desc)
         self._consuming = False
         self._sol_p = re.compile(r"(^|\n)gap>\s*")
-        self._eol_p = re.compile(r"($|\n)")
-        self._rep_p = re.compile(r"[^\n]")
+
+    @staticmethod
+    def _eol(lines: str, start: int) -> int:
+        # Returns the index after the '\n' ending the line containing start,
+        # or the index of the last '\n' or the end of lines if there is none.
+        eol = lines.find("\n", start)
+        if eol == -1:
+            return len(lines)
+        if eol == len(lines) - 1:
+            return eol
+        return eol + 1
 
     def __call__(
         self, fname: str, lines: str, nr_warnings: int = 0
@@ -512,30 +641,22 @@ class ReplaceOutputTstOrXMLFile(Rule):
         assert isinstance(lines, str)
         assert isinstance(nr_warnings, int)
         if _is_tst_or_xml_file(fname):
-            eol, out = 0, ""
+            eol, out = 0, []
             for sol in self._sol_p.finditer(lines):
                 # Replace everything except '\n' with '@'
-                out += re.sub(self._rep_p, "@", lines[eol : sol.start() + 1])
-                eol = self._eol_p.search(lines, sol.end())
-                if eol is None:
-                    # Found a start of line marker without a corresponding end
-                    # of line marker, i.e. no newline or end of line marker.
-                    # This should not be possible, unless the file is somehow
-                    # corrupt. Either way we just quietly skip the line and
-                    # hope nothing bad happens.
-                    continue
-                eol = eol.end()
-
-                out += lines[sol.end() : eol]
+                out.append(
+                    "\n".join(
+                        "@" * len(x)
+                        for x in lines[eol : sol.start() + 1].split("\n")
+                    )
+                )
+                eol = self._eol(lines, sol.end())
+                out.append(lines[sol.end() : eol])
                 while eol + 1 < len(lines) and lines[eol] == ">":
                     start = eol + 2
-                    eol = self._eol_p.search(lines, start)
-                    if eol is None:
-                        # See above comment.
-                        break
-                    eol = eol.end()
-                    out += lines[start:eol]
-            return nr_warnings, out
+                    eol = self._eol(lines, start)
+                    out.append(lines[start:eol])
+            return nr_warnings, "".join(out)
         return nr_warnings, lines
 
 
@@ -544,6 +665,27 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
     This rule checks if there are unused local variables in a function.
     """
 
+    __slots__ = (
+        "_function_p",
+        "_end_p",
+        "_var_p",
+        "_use_var_p",
+        "_var_token_p",
+        "_ws1_p",
+        "_ws2_p",
+        "_rec_p",
+        "_comment_p",
+        "_depth",
+        "_func_args",
+        "_declared_lvars",
+        "_assigned_lvars",
+        "_used_lvars",
+        "_func_start_pos",
+        "_func_bodies",
+        "_func_position",
+        "_line_starts",
+    )
+
     SubRules = {
         "W040": Rule(
             "use-id-func",
@@ -569,10 +711,11 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
 
         self._function_p = re.compile(r"\bfunction\b")
         self._end_p = re.compile(r"\bend\b")
-        self._local_p = re.compile(r"\blocal\b")
         self._var_p = re.compile(r"\w+\s*\w*")
-        self._ass_var_p = re.compile(r"([a-zA-Z0-9_\.]+)\s*:=")
         self._use_var_p = re.compile(r"(\b\w+\b)(?!\s*:=)\W*")
+        # Matches a possibly dotted identifier such as x.y.z, captures the
+        # prefix x.y., the final word z, and the := if z is assigned.
+        self._var_token_p = re.compile(r"(\.?(?:\b\w+\.)*)(\b\w+)(\s*:=)?")
         self._ws1_p = re.compile(r"[ \t\r\f\v]+")
         self._ws2_p = re.compile(r"\n[ \t\r\f\v]+")
         self._rec_p = re.compile(r"\brec\(")
@@ -587,36 +730,45 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
         self._func_start_pos = []
         self._func_bodies = []
         self._func_position = []
+        self._line_starts = []
 
     def _remove_recs_and_whitespace(self, lines: str) -> str:
         # Remove almost all whitespace
-        lines = re.sub(self._comment_p, "\n", lines)
-        lines = re.sub(self._ws1_p, " ", lines)
-        lines = re.sub(self._ws2_p, "\n", lines)
-
+        lines = self._comment_p.sub("\n", lines)
+        lines = self._ws1_p.sub(" ", lines)
+        lines = self._ws2_p.sub("\n", lines)
+
+        # The output is accumulated in out, and lines[:copied] is the part of
+        # lines that has already been copied to out. The stack contains the
+        # index in out where the contents of each open rec( start.
+        out, copied = [], 0
         stack = []
         pos = 0
         # Replace rec( -> ) so that we do not match assignments inside records
         while pos < len(lines):
             if self._rec_p.search(lines, pos, pos + 5):
-                stack.append(pos)
+                out.append(lines[copied : pos + 1])
+                copied = pos + 1
+                stack.append(len(out))
                 pos += 4
             elif lines[pos] == "(" and len(stack) > 0:
                 stack.append(None)
             elif lines[pos] == ")" and len(stack) > 0:
                 start = stack.pop()
                 if start is not None:
-                    nr_newlines = lines.count("\n", start + 1, pos + 1)
-                    var = self._use_var_p.findall(lines, start + 5, pos + 1)
+                    out.append(lines[copied : pos + 1])
+                    copied = pos + 1
+                    contents = "".join(out[start:])
+                    del out[start:]
+                    nr_newlines = contents.count("\n")
+                    var = self._use_var_p.findall(contents, 4)
                     var = [a for a in var if a not in _GAP_KEYWORDS]
                     var = " ".join(var)
-                    replacement = "rec(" + var + "\n" * nr_newlines + ")"
-                    lines = lines[: start + 1] + replacement + lines[pos + 1 :]
-                    pos -= pos - start
-                    pos += len(replacement)
+                    out.append("rec(" + var + "\n" * nr_newlines + ")")
             pos += 1
         assert len(stack) == 0
-        return lines
+        out.append(lines[copied:])
+        return "".join(out)
 
     def _start_function(
         self, fname: str, lines: str, pos: int, nr_warnings: int
@@ -648,7 +800,7 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
                 _error(
                     self,
                     fname,
-                    lines.count("\n", 0, pos),
+                    _line_number(self._line_starts, pos),
                     f'Invalid syntax: "{lines[start:end]}"',
                 )
             else:
@@ -657,14 +809,14 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
                 _error(
                     self,
                     fname,
-                    lines.count("\n", 0, pos),
+                    _line_number(self._line_starts, pos),
                     f"Duplicate function argument: {var}",
                 )
             elif var in _GAP_KEYWORDS:
                 _error(
                     self,
                     fname,
-                    lines.count("\n", 0, pos),
+                    _line_number(self._line_starts, pos),
                     f"Function argument is keyword: {var}",
                 )
             else:
@@ -713,7 +865,7 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
             if not _is_rule_suppressed(
                 fname, linenum + 1, AnalyseLVars.SubRules["W047"]
             ):
-                func_body = re.sub(r"\n", "", func_body)
+                func_body = func_body.replace("\n", "")
                 try:
                     index = self._func_bodies.index(func_body)
                     _warn(
@@ -787,7 +939,10 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
     ) -> Tuple[int, int]:
         if len(self._declared_lvars) == 0:
             _error(
-                self, fname, lines.count("\n", 0, pos), "'end' outside function"
+                self,
+                fname,
+                _line_number(self._line_starts, pos),
+                "'end' outside function",
             )
 
         self._depth -= 1
@@ -806,7 +961,7 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
         decl_lvars -= use_lvars  # difference
         func_args = set(func_args_all) - use_lvars  # difference
 
-        linenum = lines.count("\n", 0, self._func_start_pos[-1])
+        linenum = _line_number(self._line_starts, self._func_start_pos[-1])
 
         nr_warnings = self._check_assigned_but_never_used_lvars(
             ass_lvars, fname, linenum, nr_warnings
@@ -845,21 +1000,21 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
                 _error(
                     self,
                     fname,
-                    lines.count("\n", 0, pos),
+                    _line_number(self._line_starts, pos),
                     f"Name used for two local variables: {var}",
                 )
             elif var in args:
                 _error(
                     self,
                     fname,
-                    lines.count("\n", 0, pos),
+                    _line_number(self._line_starts, pos),
                     f"Name used for function argument and local variable: {var}",
                 )
             elif var in _GAP_KEYWORDS:
                 _error(
                     self,
                     fname,
-                    lines.count("\n", 0, pos),
+                    _line_number(self._line_starts, pos),
                     f"Local variable is keyword: {var}",
                 )
             else:
@@ -877,7 +1032,7 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
             _error(
                 self,
                 fname,
-                lines.count("\n", 0, pos),
+                _line_number(self._line_starts, pos),
                 "'function' without 'end'",
             )
 
@@ -888,9 +1043,18 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
             end = end.start()
         if self._depth >= 0:
             a_lvars = self._assigned_lvars[self._depth]
-            a_lvars |= set(self._ass_var_p.findall(lines, pos, end))
             u_lvars = self._used_lvars[self._depth]
-            u_lvars |= set(self._use_var_p.findall(lines, pos, end))
+            # Every word in a prefix x.y. is used, the final word is used
+            # unless it is assigned, in which case x.y.z is assigned.
+            for prefix, var, assign in self._var_token_p.findall(
+                lines, pos, end
+            ):
+                if prefix:
+                    u_lvars.update(x for x in prefix.split(".") if x)
+                if assign:
+                    a_lvars.add(prefix + var)
+                else:
+                    u_lvars.add(var)
         return end, nr_warnings
 
     def __call__(
@@ -901,28 +1065,31 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
         assert isinstance(nr_warnings, int)
         if _is_tst_or_xml_file(fname):
             return nr_warnings, lines
-        orig_lines = lines[:]
-        lines = self._remove_recs_and_whitespace(lines)
+        # Strings are immutable, so lines is unchanged and can be returned
+        stripped = self._remove_recs_and_whitespace(lines)
+        self._line_starts = _line_starts(stripped)
         pos = 0
-        while pos < len(lines):
-            if self._function_p.search(lines, pos, pos + len("function")):
+        while pos < len(stripped):
+            if _is_keyword_at(stripped, pos, "function"):
                 pos, nr_warnings = self._start_function(
-                    fname, lines, pos, nr_warnings
+                    fname, stripped, pos, nr_warnings
                 )
-            elif self._local_p.search(lines, pos, pos + len("local") + 1):
+            elif _is_keyword_at(stripped, pos, "local") or _is_keyword_at(
+                stripped, pos + 1, "local"
+            ):
                 pos, nr_warnings = self._add_declared_lvars(
-                    fname, lines, pos + len("local") + 1, nr_warnings
+                    fname, stripped, pos + len("local") + 1, nr_warnings
                 )
-            elif self._end_p.search(lines, pos, pos + len("end")):
+            elif _is_keyword_at(stripped, pos, "end"):
                 pos, nr_warnings = self._end_function(
-                    fname, lines, pos, nr_warnings
+                    fname, stripped, pos, nr_warnings
                 )
             else:
                 pos, nr_warnings = self._find_lvars(
-                    fname, lines, pos, nr_warnings
+                    fname, stripped, pos, nr_warnings
                 )
 
-        return nr_warnings, orig_lines
+        return nr_warnings, lines
 
 
 ###############################################################################
@@ -930,51 +1097,92 @@ class AnalyseLVars(Rule):  # pylint: disable=too-many-instance-attributes
 ###############################################################################
 
 
-class LineTooLong(Rule):
+class WarnRegexLine(WarnRegexBase):
     """
-    Warn if the length of a line exceeds 80 characters.
-
-    This rule does not modify the line.
+    Warn if regex matches.
     """
 
-    def __init__(self, name: str, code: str, desc: str = "") -> None:
-        Rule.__init__(self, name, code, desc)
+    __slots__ = ()
 
     def __call__(
-        self, fname: str, lines: str, linenum: int, nr_warnings: int = 0
+        self, fname: str, line: str, linenum: int, nr_warnings: int = 0
     ) -> Tuple[int, str]:
-        cols = _GLOB_CONFIG["columns"]
-        if _is_tst_or_xml_file(fname):
-            return nr_warnings, lines
-        if len(lines[linenum]) - 1 > cols:
-            _warn(
-                self,
-                fname,
-                linenum,
-                f"Too long line ({len(lines[linenum]) - 1} / {cols})",
-            )
-            nr_warnings += 1
-        return nr_warnings, lines
+        assert isinstance(fname, str)
+        assert isinstance(line, str)
+        assert isinstance(linenum, int)
+        assert isinstance(nr_warnings, int)
+        if self._match(line) is not None:
+            _warn(self, fname, linenum, self._warning_msg)
+            return nr_warnings + 1, line
+        return nr_warnings, line
 
+    def line_pattern(self) -> Union[str, None]:
+        """
+        Returns the pattern that a line must match for this rule to warn about
+        it, or None if the pattern contains a backreference, and so cannot be
+        combined with the patterns of other rules.
+        """
+        if _BACKREF_PATTERN.search(self._pattern.pattern):
+            return None
+        return self._pattern.pattern
 
-class WarnRegexLine(WarnRegexBase):
+
+class WarnPredicateLine(Rule):
     """
-    Warn if regex matches.
+    Instances of this class produce a warning whenever a predicate holds for a
+    line. This is used for rules which can be checked with str methods rather
+    than a regex.
     """
 
+    __slots__ = ("_warning_msg", "_predicate", "_skip")
+
+    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self,
+        name: str,
+        code: str,
+        desc: str,
+        warning_msg: str,
+        predicate: Callable[[str], bool],
+        skip: Callable[[str], bool] = lambda _: False,
+    ) -> None:
+        Rule.__init__(self, name, code, desc)
+        assert isinstance(warning_msg, str)
+        self._warning_msg = warning_msg
+        self._predicate = predicate
+        self._skip = skip
+
     def __call__(
-        self, fname: str, lines: str, linenum: int, nr_warnings: int = 0
+        self, fname: str, line: str, linenum: int, nr_warnings: int = 0
     ) -> Tuple[int, str]:
         assert isinstance(fname, str)
-        assert isinstance(lines, list)
+        assert isinstance(line, str)
         assert isinstance(linenum, int)
-        assert linenum < len(lines)
         assert isinstance(nr_warnings, int)
-        if not self.skip(fname):
-            if self._match(lines[linenum]) is not None:
-                _warn(self, fname, linenum, self._warning_msg)
-                return nr_warnings + 1, lines
-        return nr_warnings, lines
+        if self._predicate(line):
+            _warn(self, fname, linenum, self._warning_msg)
+            return nr_warnings + 1, line
+        return nr_warnings, line
+
+    def skip(self, fname: str) -> bool:
+        """
+        Returns True if this rule should not be applied to fname.
+        """
+        return self._skip(fname)
+
+
+@functools.cache
+def _whitespace_operator_patterns(
+    op: str, exceptions: Tuple[str, ...]
+) -> Tuple[re.Pattern, Tuple[re.Pattern, ...]]:
+    """
+    Returns the compiled pattern and exceptions for the operator op, so that
+    each is compiled at most once.
+    """
+    gop = "(" + op + ")"
+    pattern = rf"(\S{gop}|{gop}\S|\s{{2,}}{gop}|{gop}\s{{2,}})"
+    return re.compile(pattern), tuple(
+        re.compile(e.replace(op, gop)) for e in exceptions
+    )
 
 
 class WhitespaceOperator(WarnRegexLine):
@@ -983,6 +1191,8 @@ class WhitespaceOperator(WarnRegexLine):
     operator is incorrect.
     """
 
+    __slots__ = ()
+
     def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
         self,
         name: str,
@@ -996,14 +1206,12 @@ class WhitespaceOperator(WarnRegexLine):
         assert op[0] != "(" and op[-1] != ")"
         assert exceptions is None or isinstance(exceptions, list)
         assert all(isinstance(e, str) for e in exceptions)
-        gop = "(" + op + ")"
-        pattern = rf"(\S{gop}|{gop}\S|\s{{2,}}{gop}|{gop}\s{{2,}})"
-        self._pattern = re.compile(pattern)
+        self._pattern, self._exceptions = _whitespace_operator_patterns(
+            op, tuple(exceptions)
+        )
         self._warning_msg = "Wrong whitespace around operator " + op.replace(
             "\\", ""
         )
-        exceptions = [e.replace(op, "(" + op + ")") for e in exceptions]
-        self._exceptions = [re.compile(e) for e in exceptions]
         self._exception_group = op.replace("\\", "")
 
 
@@ -1013,6 +1221,8 @@ class UnalignedPatterns(Rule):
     aligned.
     """
 
+    __slots__ = ("_last_line_col", "_pattern", "_group", "_msg")
+
     # TODO use keyword args?
     def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
         self,
@@ -1032,27 +1242,26 @@ class UnalignedPatterns(Rule):
         self._group = group
         self._msg = msg
 
+    def skip(self, fname: str) -> bool:
+        return _is_tst_or_xml_file(fname)
+
     def __call__(
-        self, fname: str, lines: List[str], linenum: int, nr_warnings: int = 0
-    ) -> Tuple[int, List[str]]:
+        self, fname: str, line: str, linenum: int, nr_warnings: int = 0
+    ) -> Tuple[int, str]:
         assert isinstance(fname, str)
-        assert isinstance(lines, list)
+        assert isinstance(line, str)
         assert isinstance(linenum, int)
         assert isinstance(nr_warnings, int)
-        if (
-            _is_rule_suppressed(fname, linenum, self)
-            or _is_tst_or_xml_file(fname)
-            or linenum == 0
-        ):
-            return nr_warnings, lines
-        col = self._pattern.search(lines[linenum])
+        if _is_rule_suppressed(fname, linenum, self) or linenum == 0:
+            return nr_warnings, line
+        col = self._pattern.search(line)
         if col is not None and self._last_line_col is not None:
             group = self._group
             if col.start(group) != self._last_line_col.start(group):
                 _warn(self, fname, linenum, self._msg)
-                return nr_warnings + 1, lines
+                return nr_warnings + 1, line
         self._last_line_col = col
-        return nr_warnings, lines
+        return nr_warnings, line
 
     def reset(self) -> None:
         self._last_line_col = None
@@ -1067,72 +1276,68 @@ class Indentation(Rule):
     required.
     """
 
+    __slots__ = ("_expected", "_msg")
+
+    # All of the keywords in _before and _after, found with a single search.
+    _keyword = re.compile(
+        r"(?<!\w)(elif|else|end|od|fi|until|then|do|repeat|function|if|for"
+        r"|while|atomic)(?!\w)"
+    )
+    # The indentation level changes at most once per line for each group of
+    # keywords. The second entry of each pair is the change in the indentation
+    # level as a multiple of the configured indentation. The multiple is used
+    # because rules are instantiated **before** _GLOB_CONFIG is initialised.
+    _before = (
+        (frozenset(("elif", "else")), -1),
+        (frozenset(("end",)), -1),
+        (frozenset(("od", "fi")), -1),
+        (frozenset(("until",)), -1),
+    )
+    _after = (
+        (frozenset(("then", "do")), -1),
+        (frozenset(("repeat", "else")), 1),
+        (frozenset(("function",)), 1),
+        (frozenset(("if", "for", "while", "elif", "atomic")), 2),
+    )
+
     def __init__(self, name: str, code: str, desc: str = "") -> None:
         Rule.__init__(self, name, code, desc)
         self._expected = 0
-        self._indent = re.compile(r"^(\s*)\S")
-        self._blank = re.compile(r"^\s*$")
-        self._before = []
-        self._after = []
         self._msg = "Bad indentation: found %d but expected at least %d"
 
-    # Really initialize outside __init__ because rules are instanstiated
-    # **before** __GLOB_CONFIG is initialised.
-    def __init_real(self):
-        if len(self._before) == 0:
-            assert len(self._after) == 0
-            ind = _GLOB_CONFIG["indentation"]
-            self._before = [
-                (re.compile(r"(\W|^)(elif|else)(\W|$)"), -ind),
-                (re.compile(r"(\W|^)end(\W|$)"), -ind),
-                (re.compile(r"(\W|^)(od|fi)(\W|$)"), -ind),
-                (re.compile(r"(\W|^)until(\W|$)"), -ind),
-            ]
-            self._after = [
-                (re.compile(r"(\W|^)(then|do)(\W|$)"), -ind),
-                (re.compile(r"(\W|^)(repeat|else)(\W|$)"), ind),
-                (re.compile(r"(\W|^)function(\W|$)"), ind),
-                (
-                    re.compile(r"(\W|^)(if|for|while|elif|atomic)(\W|$)"),
-                    2 * ind,
-                ),
-            ]
+    def skip(self, fname: str) -> bool:
+        return _is_tst_or_xml_file(fname)
 
     def __call__(
-        self, fname: str, lines: List[str], linenum: int, nr_warnings: int = 0
-    ) -> Tuple[int, List[str]]:
+        self, fname: str, line: str, linenum: int, nr_warnings: int = 0
+    ) -> Tuple[int, str]:
         assert isinstance(fname, str)
-        assert isinstance(lines, list)
+        assert isinstance(line, str)
         assert isinstance(linenum, int)
         assert isinstance(nr_warnings, int)
         assert self._expected >= 0
-        self.__init_real()
 
-        if (
-            _is_rule_suppressed(fname, linenum, self)
-            or _is_tst_or_xml_file(fname)
-            or self._blank.search(lines[linenum])
-        ):
-            return nr_warnings, lines
+        stripped = line.lstrip()
+        if _is_rule_suppressed(fname, linenum, self) or not stripped:
+            return nr_warnings, line
 
-        for pair in self._before:
-            if pair[0].search(lines[linenum]):
-                self._expected += pair[1]
+        keywords = set(self._keyword.findall(line))
+        if keywords:
+            ind = _GLOB_CONFIG["indentation"]
+            for group, multiple in self._before:
+                if not keywords.isdisjoint(group):
+                    self._expected += multiple * ind
 
-        indent = self._get_indent_level(lines[linenum])
+        indent = len(line) - len(stripped)
         if indent < self._expected:
             _warn(self, fname, linenum, self._msg % (indent, self._expected))
             nr_warnings += 1
 
-        for pair in self._after:
-            if pair[0].search(lines[linenum]):
-                self._expected += pair[1]
-        return nr_warnings, lines
-
-    def _get_indent_level(self, line: str) -> int:
-        indent = self._indent.search(line)
-        assert indent
-        return len(indent.group(1))
+        if keywords:
+            for group, multiple in self._after:
+                if not keywords.isdisjoint(group):
+                    self._expected += multiple * ind
+        return nr_warnings, line
 
     def reset(self):
         self._expected = 0
@@ -1184,6 +1389,11 @@ def __explain(args: Dict[str, Any]) -> None:
     rows.sort()
     rows = list(dict.fromkeys(rows))
     if len(rows) > 0:
+        # rich is only imported when there is something to explain
+        # pylint: disable=import-outside-toplevel
+        from rich.console import Console
+        from rich.table import Table
+
         table = Table(
             title="gaplint rules", show_lines=True, width=90, min_width=80
         )
@@ -1202,6 +1412,28 @@ def __explain(args: Dict[str, Any]) -> None:
     sys.exit(0)
 
 
+class _VersionAction(argparse.Action):
+    """
+    Prints the version of gaplint and exits, looking up the version in the
+    package metadata only if --version is actually given.
+    """
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, **kwargs):
+        super().__init__(
+            option_strings, dest, nargs=0, default=argparse.SUPPRESS, **kwargs
+        )
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        # pylint: disable=import-outside-toplevel
+        from importlib.metadata import version
+
+        # Like argparse's own "version" action, print to stdout, not stderr.
+        parser._print_message(  # pylint: disable=protected-access
+            f"{parser.prog} version {version('gaplint')}\n", sys.stdout
+        )
+        parser.exit()
+
+
 def _parse_cmd_line_args(kwargs) -> Dict[str, Any]:
     """
     Pass kwargs as an argument for the check for \"files\" o/w not needed.
@@ -1289,11 +1521,10 @@ def _parse_cmd_line_args(kwargs) -> Dict[str, Any]:
         help=f"enable verbose mode (default: {default})",
     )
 
-    vers_num = version("gaplint")
     parser.add_argument(
         "--version",
-        action="version",
-        version=f"%(prog)s version {vers_num}",
+        action=_VersionAction,
+        help="show program's version number and exit",
     )
 
     parser.add_argument(
@@ -1522,17 +1753,17 @@ def __normalize_disabled_rules(
 
 
 def __normalize_files(args: Dict[str, Any]):
-    valid_extensions = set(["g", "g.txt", "gi", "gd", "gap", "tst", "xml"])
     files = []
     for fname in args["files"]:
-        if not exists(fname):
+        try:
+            mode = os.stat(fname).st_mode
+        except (OSError, ValueError):
+            mode = None
+        if mode is None:
             _info_action(f"SKIPPING {fname}: file does not exist!")
-        elif not isfile(fname):
+        elif not stat.S_ISREG(mode):
             _info_action(f"SKIPPING {fname}: not a file!")
-        elif (
-            fname.split(".")[-1] not in valid_extensions
-            and ".".join(fname.split(".")[-2:]) not in valid_extensions
-        ):
+        elif not fname.endswith(_VALID_EXTENSIONS):
             _info_action(f"IGNORING {fname}: not a valid file extension")
         else:
             files.append(fname)
@@ -1564,33 +1795,34 @@ def __init_globals(
     for code in args["disable"]:
         # TODO remove this, just remove the rule from the list
         _GLOB_SUPPRESSIONS.add(code)
-    __init_file_and_line_suppressions(args)
 
 
 def __config_yml_path(dir_path: str) -> Union[None, str]:
     """
-    Recursive function that takes the path of a directory to search and
-    searches for the gaplint.yml config script. If the script is not found the
-    function is then called on the parent directory - recursive case. This
-    continues until we encounter a directory .git in our search (script not
-    found, returns None), locate the script (returns script path), or until the
-    root directory has been searched (script not found, returns None) - base
-    cases A, B, C.
+    Takes the path of a directory to search and searches for the gaplint.yml
+    config script. If the script is not found, then the parent directory is
+    searched, and so on. This continues until we encounter a directory .git in
+    our search (script not found, returns None), locate the script (returns
+    script path), or until the root directory has been searched (script not
+    found, returns None).
     """
     assert isinstance(dir_path, str)
     assert isdir(dir_path)
-    entries = listdir(dir_path)
-
-    if ".gaplint.yml" in entries:
-        yml_path = abspath(join(dir_path, ".gaplint.yml"))
-        return yml_path
-    if ".git" in entries and isdir(abspath(join(dir_path, ".git"))):
-        return None
-
-    pardir_path = abspath(join(dir_path, os.pardir))
-    if pardir_path == dir_path:
-        return None
-    return __config_yml_path(pardir_path)  # recursive call
+    while True:
+        found_git = False
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.name == ".gaplint.yml":
+                    return abspath(entry.path)
+                if entry.name == ".git" and entry.is_dir():
+                    found_git = True
+        if found_git:
+            return None
+
+        pardir_path = abspath(join(dir_path, os.pardir))
+        if pardir_path == dir_path:
+            return None
+        dir_path = pardir_path
 
 
 def __get_yml_dict() -> Tuple[str, Dict[str, Any]]:
@@ -1598,10 +1830,19 @@ def __get_yml_dict() -> Tuple[str, Dict[str, Any]]:
     if config_yml_fname is None:
         return "", {}
 
+    # yaml is only imported when there is a configuration file to parse
+    # pylint: disable=import-outside-toplevel
+    import yaml
+
+    try:
+        from yaml import CSafeLoader as Loader
+    except ImportError:  # libyaml is not available
+        from yaml import SafeLoader as Loader
+
     _info_action(f"Using configurations in {config_yml_fname}")
     try:
         with open(config_yml_fname, "r", encoding="utf-8") as config_yml_file:
-            yml_dic = yaml.load(config_yml_file, Loader=yaml.FullLoader)
+            yml_dic = yaml.load(config_yml_file, Loader=Loader)
     except (yaml.YAMLError, IOError):
         _info_action("IGNORING {config_yml_fname}: error parsing YAML")
         return "", {}
@@ -1617,7 +1858,8 @@ def __get_yml_dict() -> Tuple[str, Dict[str, Any]]:
 
 
 def __init_rules() -> None:
-    global _FILE_RULES, _LINE_RULES  # pylint: disable=global-statement
+    # pylint: disable=global-statement
+    global _FILE_RULES, _LINE_RULES, _LINE_RULE_GROUPS, _RULES_BY_NAME_OR_CODE
     if len(_FILE_RULES) != 0:
         return
     _FILE_RULES = [
@@ -1672,14 +1914,14 @@ def __init_rules() -> None:
             r"\bif\b.*?\bthen\b\n?\s*return\s*false;\n?\s*else\s*\n?\s*return\s*true;\n?\s*fi;",
             'Replace "if X then return false; else return true; fi;" by "return not X;"',
         ),
-    ]
-    _LINE_RULES = [
         LineTooLong(
             "line-too-long",
             "W002",
             "Warns if there is a line which is longer than the "
             "configured maximum (defaults to [code]80[/code]).",
         ),
+    ]
+    _LINE_RULES = [
         Indentation(
             "indentation", "W003", "Warns if a line is under indented."
         ),
@@ -1710,13 +1952,12 @@ def __init_rules() -> None:
             1,
             "Unaligned comments in consecutive lines",
         ),
-        WarnRegexLine(
+        WarnPredicateLine(
             "trailing-whitespace",
             "W007",
             "Warns if there is trailing whitespace at the end of a line.",
-            r"^(?!#\!).*\s+$",
             "Trailing whitespace",
-            [],
+            lambda line: line[-1:].isspace() and not line.startswith("#!"),
             _is_tst_or_xml_file,
         ),
         WarnRegexLine(
@@ -1762,13 +2003,12 @@ def __init_rules() -> None:
             r"\s(\)|\]|\})",
             "No space allowed before bracket",
         ),
-        WarnRegexLine(
+        WarnPredicateLine(
             "multiple-semicolons",
             "W014",
             "Warns if there is more than one semicolon in a line.",
-            r";.*;",
             "More than one semicolon",
-            [],
+            lambda line: line.count(";") > 1,
             _is_tst_or_xml_file,
         ),
         WarnRegexLine(
@@ -1786,12 +2026,12 @@ def __init_rules() -> None:
             r"(\S:=|:=(\S|\s{2,}))",
             "Wrong whitespace around operator :=",
         ),
-        WarnRegexLine(
+        WarnPredicateLine(
             "tabs",
             "W017",
             "Warns if there are tabs.",
-            r"\t",
             "There are tabs in this line, replace with spaces",
+            lambda line: "\t" in line,
         ),
         WarnRegexLine(
             "function-local-same-line",
@@ -1989,6 +2229,27 @@ def __init_rules() -> None:
             "Replace Unbind(foo[Length(foo)]) by Remove(foo)",
         ),
     ]
+    # The WhitespaceOperator rules and the other WarnRegexLine rules are
+    # grouped separately, and the patterns in each group are combined into one.
+    # Other line rules, such as WarnPredicateLine, are not in any group, and so
+    # are applied to every line.
+    groups = ([], [])
+    for rule in _LINE_RULES:
+        if isinstance(rule, WarnRegexLine) and rule.line_pattern() is not None:
+            groups[isinstance(rule, WhitespaceOperator)].append(rule)
+    _LINE_RULE_GROUPS = [
+        (
+            re.compile("|".join(f"(?:{x.line_pattern()})" for x in group)),
+            frozenset(group),
+        )
+        for group in groups
+    ]
+    _RULES_BY_NAME_OR_CODE = {}
+    for rule in itertools.chain(
+        _FILE_RULES, _LINE_RULES, AnalyseLVars.SubRules.values()
+    ):
+        _RULES_BY_NAME_OR_CODE[rule.code] = rule
+        _RULES_BY_NAME_OR_CODE[rule.name] = rule
 
 
 ###############################################################################
@@ -2002,14 +2263,15 @@ def __can_disable_rule_name_or_code(name_or_code: str, where: str) -> bool:
 
     if name_or_code == "all":
         return True
-    for rule in all_rules().values():
-        if name_or_code in (rule.name, rule.code):
-            if rule.code[0] == "M":
-                _info_action(
-                    f'IGNORING cannot disable rule "{name_or_code}" {where}'
-                )
-                return False
-            return True
+    __init_rules()
+    rule = _RULES_BY_NAME_OR_CODE.get(name_or_code)
+    if rule is not None:
+        if rule.code[0] == "M":
+            _info_action(
+                f'IGNORING cannot disable rule "{name_or_code}" {where}'
+            )
+            return False
+        return True
     _info_action(f'IGNORING invalid rule name or code "{name_or_code}" {where}')
     return False
 
@@ -2028,9 +2290,9 @@ def __add_file_suppressions(
             name_or_code, f"at {fname}:{linenum + 1}"
         ):
             if fname not in _FILE_SUPPRESSIONS:
-                _FILE_SUPPRESSIONS[fname] = {}
+                _FILE_SUPPRESSIONS[fname] = set()
             code = Rule.to_code(name_or_code)
-            _FILE_SUPPRESSIONS[fname][code] = None
+            _FILE_SUPPRESSIONS[fname].add(code)
 
 
 def __add_line_suppressions(
@@ -2049,51 +2311,62 @@ def __add_line_suppressions(
             if fname not in _LINE_SUPPRESSIONS:
                 _LINE_SUPPRESSIONS[fname] = {}
             if linenum + 1 not in _LINE_SUPPRESSIONS[fname]:
-                _LINE_SUPPRESSIONS[fname][linenum + 1] = {}
+                _LINE_SUPPRESSIONS[fname][linenum + 1] = set()
             code = Rule.to_code(name_or_code)
-            _LINE_SUPPRESSIONS[fname][linenum + 1][code] = None
-
+            _LINE_SUPPRESSIONS[fname][linenum + 1].add(code)
 
-# TODO this should be a line rule called before any other line rule, to avoid
-# reading the files more than once
-def __init_file_and_line_suppressions(args: Dict[str, Any]) -> None:
-    comment_line_p = re.compile(r"^\s*($|#)")
-    gaplint_p = re.compile(r"\s*#\s*gaplint:\s*disable\s*=\s*")
-    rules_p = re.compile(r"[a-zA-Z0-9_\-]+")
 
-    this_line_p = re.compile(r"#\s*gaplint:\s*disable\s*=\s*")
-    next_line_p = re.compile(r"#\s* gaplint:\s*disable\(nextline\)=\s*")
+def __init_file_and_line_suppressions(fname: str, lines: List[str]) -> None:
+    """
+    Finds the rules suppressed for the entire file fname, or for some of its
+    lines, where lines is the contents of fname split into lines.
+    """
+    assert isinstance(fname, str)
+    assert isinstance(lines, list)
+    linenum = 0
+    # Find rules suppressed for the entire file at the start of the file
+    while linenum < len(lines) and _COMMENT_LINE_PATTERN.search(lines[linenum]):
+        match = _FILE_SUPPRESSION_PATTERN.search(lines[linenum])
+        if match:
+            names_or_codes = _RULE_NAMES_PATTERN.findall(
+                lines[linenum], match.end()
+            )
+            __add_file_suppressions(names_or_codes, fname, linenum)
+        linenum += 1
 
-    for fname in args["files"]:
-        try:
-            with open(fname, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-        except IOError:
-            _info_action(f"IGNORING unreadable file {fname}!")
+    # Find rules suppressed for individual lines
+    for linenum in range(linenum, len(lines)):
+        if "gaplint" not in lines[linenum]:
             continue
-        linenum = 0
-        # Find rules suppressed for the entire file at the start of the file
-        while linenum < len(lines) and comment_line_p.search(lines[linenum]):
-            match = gaplint_p.search(lines[linenum])
-            if match:
-                names_or_codes = rules_p.findall(lines[linenum], match.end())
-                __add_file_suppressions(names_or_codes, fname, linenum)
-            linenum += 1
-
-        # Find rules suppressed for individual lines
-        while linenum < len(lines):
-            match = this_line_p.search(lines[linenum])
-            if match:
-                names_or_codes = rules_p.findall(lines[linenum], match.end())
-                __add_line_suppressions(names_or_codes, fname, linenum)
-            else:
-                match = next_line_p.search(lines[linenum])
-                if match:
-                    names_or_codes = rules_p.findall(
-                        lines[linenum], match.end()
-                    )
-                    __add_line_suppressions(names_or_codes, fname, linenum)
-            linenum += 1
+        # If both markers are in the line, then "disable=" takes precedence.
+        match = _THIS_LINE_SUPPRESSION_PATTERN.search(lines[linenum])
+        if match is None:
+            match = _NEXT_LINE_SUPPRESSION_PATTERN.search(lines[linenum])
+        if match:
+            names_or_codes = _RULE_NAMES_PATTERN.findall(
+                lines[linenum], match.end()
+            )
+            __add_line_suppressions(names_or_codes, fname, linenum)
+
+
+def _is_rule_suppressed_in_file(fname: str, rule: Rule) -> bool:
+    """
+    Takes a filename and rule. Returns True if the rule is suppressed globally
+    or for the entire file, and False otherwise.
+    """
+    assert isinstance(fname, str)
+    assert isinstance(rule, Rule)
+
+    if rule.code[0] == "M":
+        return False
+    if _GLOB_SUPPRESSIONS and (
+        "all" in _GLOB_SUPPRESSIONS or rule.code in _GLOB_SUPPRESSIONS
+    ):
+        return True
+    file_suppressions = _FILE_SUPPRESSIONS.get(fname)
+    return bool(file_suppressions) and (
+        "all" in file_suppressions or rule.code in file_suppressions
+    )
 
 
 def _is_rule_suppressed(fname: str, linenum: int, rule: Rule) -> bool:
@@ -2107,21 +2380,13 @@ def _is_rule_suppressed(fname: str, linenum: int, rule: Rule) -> bool:
 
     if rule.code[0] == "M":
         return False
-    if "all" in _GLOB_SUPPRESSIONS or rule.code in _GLOB_SUPPRESSIONS:
-        return True
-    if fname in _FILE_SUPPRESSIONS and (
-        "all" in _FILE_SUPPRESSIONS[fname]
-        or rule.code in _FILE_SUPPRESSIONS[fname]
-    ):
+    if _is_rule_suppressed_in_file(fname, rule):
         return True
 
-    if (
-        fname in _LINE_SUPPRESSIONS
-        and linenum in _LINE_SUPPRESSIONS[fname]
-        and (rule.code in _LINE_SUPPRESSIONS[fname][linenum])
-    ):
-        return True
-    return False
+    line_suppressions = _LINE_SUPPRESSIONS.get(fname)
+    if not line_suppressions:
+        return False
+    return rule.code in line_suppressions.get(linenum, ())
 
 
 ###############################################################################
@@ -2130,6 +2395,10 @@ def _is_rule_suppressed(fname: str, linenum: int, rule: Rule) -> bool:
 
 
 def __verbose_msg_per_file(args: Dict[str, Any], fname: str, i: int) -> None:
+    if _SILENT or not _VERBOSE:
+        # Avoid finding the longest file name for every file, when the message
+        # is not going to be shown anyway.
+        return
     num_files = len(args["files"])
     num_digits = len(str(num_files))
     prefix_len = max(len(x) for x in args["files"]) + 2
@@ -2151,6 +2420,83 @@ def __at_exit(
     sys.exit(total_num_warnings)
 
 
+def __run_line_rules(fname: str, lines: List[str], nr_warnings: int) -> int:
+    """
+    Applies the line rules to every line in lines, the (modified) contents of
+    the file fname, and returns the updated number of warnings. Each line rule
+    is called with a single line, and its number in the file.
+    """
+    # Drop the rules skipped for fname, or suppressed globally or for the
+    # entire file, once, so that suppressions only need to be checked for those
+    # lines that have line suppressions.
+    file_rules = [
+        rule
+        for rule in _LINE_RULES
+        if not (rule.skip(fname) or _is_rule_suppressed_in_file(fname, rule))
+    ]
+    if len(file_rules) == 0:
+        return nr_warnings
+    rules_by_groups = {}
+    line_suppressions = _LINE_SUPPRESSIONS.get(fname, {})
+    for linenum, line in enumerate(lines):
+        # Classify the line once for each group of rules, rather than letting
+        # every WarnRegexLine rule search it for its own pattern.
+        key = tuple(
+            pattern.search(line) is None for pattern, _ in _LINE_RULE_GROUPS
+        )
+        if key not in rules_by_groups:
+            skipped = [
+                group
+                for (_, group), unmatched in zip(_LINE_RULE_GROUPS, key)
+                if unmatched
+            ]
+            rules_by_groups[key] = [
+                rule
+                for rule in file_rules
+                if not any(rule in group for group in skipped)
+            ]
+        line_rules = rules_by_groups[key]
+        if linenum + 1 in line_suppressions:
+            line_rules = [
+                rule
+                for rule in line_rules
+                if not _is_rule_suppressed(fname, linenum + 1, rule)
+            ]
+        for rule in line_rules:
+            nr_warnings, line = rule(fname, line, linenum, nr_warnings)
+    return nr_warnings
+
+
+def __lint_file(
+    fname: str,
+    lines: str,
+    nr_previous_warnings: int,
+    too_many_warnings: Callable[[int], None],
+) -> int:
+    """
+    Apply every rule to the contents <lines> of the file <fname>, and return
+    the number of warnings found in this file. Once every rule has run, the
+    function <too_many_warnings> is called with the running total of warnings,
+    including the <nr_previous_warnings> found in earlier files.
+    """
+    # The file is only read once, so its suppressions are found here
+    __init_file_and_line_suppressions(fname, lines.split("\n"))
+
+    nr_warnings = 0
+    for rule in _FILE_RULES:
+        # W000 is special and handles its own suppressions, since it is
+        # really several rules in one.
+        if rule.code == "W000" or not _is_rule_suppressed_in_file(fname, rule):
+            nr_warnings, lines = rule(fname, lines, nr_warnings)
+    nr_warnings = __run_line_rules(fname, lines.split("\n"), nr_warnings)
+    too_many_warnings(nr_warnings + nr_previous_warnings)
+    for rule in _LINE_RULES:
+        rule.reset()
+    for rule in _FILE_RULES:
+        rule.reset()
+    return nr_warnings
+
+
 # TODO fix linting errors here
 def main(  # pylint: disable=too-many-locals, too-many-statements, too-many-branches
     **kwargs,
@@ -2240,28 +2586,12 @@ def main(  # pylint: disable=too-many-locals, too-many-statements, too-many-bran
             _info_action(f"SKIPPING {fname}: cannot open for reading")
             continue
 
-        nr_warnings = 0
-        for rule in _FILE_RULES:
-            # W000 is special and handles its own suppressions, since it is
-            # really several rules in one.
-            if rule.code == "W000" or not _is_rule_suppressed(fname, 0, rule):
-                nr_warnings, lines = rule(fname, lines, nr_warnings)
-                too_many_warnings(nr_warnings + total_num_warnings)
-        lines = lines.split("\n")
-        for linenum in range(len(lines)):
-            for rule in _LINE_RULES:
-                if rule.code == "W000" or not _is_rule_suppressed(
-                    fname, linenum + 1, rule
-                ):
-                    nr_warnings, lines = rule(
-                        fname, lines, linenum, nr_warnings
-                    )
-        too_many_warnings(nr_warnings + total_num_warnings)
-        for rule in _LINE_RULES:
-            rule.reset()
-        for rule in _FILE_RULES:
-            rule.reset()
-        total_num_warnings += nr_warnings
+        total_num_warnings += __lint_file(
+            fname,
+            lines,
+            total_num_warnings,
+            too_many_warnings,
+        )
 
     __at_exit(args, total_num_warnings, start_time)
 
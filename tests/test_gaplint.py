@@ -170,6 +170,17 @@ def test_disable_global_rule():
     assert e.value.code == 0
 
 
+def test_indentation_between_runs():
+    for indentation, expected in ((2, 0), (4, 86), (2, 0)):
+        with pytest.raises(SystemExit) as e:
+            run_gaplint(
+                files=["tests/test2.g"],
+                enable="W003",
+                indentation=indentation,
+            )
+        assert e.value.code == expected
+
+
 def test_hpc_gap():
     with pytest.raises(SystemExit) as excinfo:
         run_gaplint(files=["tests/filter.gi"])
@@ -182,6 +193,14 @@ def test_hpc_gap():
     assert excinfo.value.code == 1
 
 
+def test_max_warnings_line_too_long():
+    # The line-too-long warnings do not stop the line rules from running
+    with pytest.raises(SystemExit) as excinfo:
+        run_gaplint(files=["tests/test6.g"], max_warnings=3)
+
+    assert excinfo.value.code == 6
+
+
 def test_wrong_ext():
     with pytest.raises(SystemExit) as excinfo:
         run_gaplint(files=["tests/file.wrongext"])
@@ -194,6 +213,13 @@ def test_autodoc_whitespace():
     assert e.value.code == 0
 
 
+def test_ReplaceAnnoyUTF8Chars():
+    rule = gaplint.ReplaceAnnoyUTF8Chars("M995", "test-utf8-rule")
+    assert rule("fname", "x \xc2\xab y \xc2\xbb", 0) == (0, "x << y >>")
+    # removing one character does not create another to be removed
+    assert rule("fname", "\xcc\xcc\xa8\xb1", 0) == (0, "\xcc\xb1")
+
+
 def test_ReplaceOutputTstOrXMLFile():
     rule = gaplint.ReplaceOutputTstOrXMLFile("W998", "another-test-rule")
     rule("fname", "line does not start with gap> or >", 0)
@@ -201,6 +227,50 @@ def test_ReplaceOutputTstOrXMLFile():
     rule("fname", "line has neither prefix", 0)
 
 
+def test_ReplaceComments():
+    rule = gaplint.ReplaceComments("W997", "yet-another-test-rule")
+    assert rule("fname", 'y;\nx := "#"; ## a!b\ny;', 0) == (
+        0,
+        'y;\nx := "#"; ## @!@\ny;',
+    )
+    # comment at the end of a file without a trailing newline
+    assert rule("fname", "x := 1; # abc", 0) == (0, "x := 1; # @@@")
+    assert rule("fname", "x := 1; #", 0) == (0, "x := 1; #")
+    # strings and chars on the first line, and quotes of the other kind
+    assert rule("fname", 'x := "#"; # a', 0) == (0, 'x := "#"; # @')
+    assert rule("fname", "x := '#'; # a", 0) == (0, "x := '#'; # @")
+    assert rule("fname", 'Print("don\'t"); # 1+2', 0) == (
+        0,
+        'Print("don\'t"); # @@@',
+    )
+
+
+def test_WarnPredicateLine():
+    rule = gaplint.WarnPredicateLine(
+        "W996",
+        "test-predicate-rule",
+        "",
+        "More than one semicolon",
+        lambda line: line.count(";") > 1,
+    )
+    assert rule("fname", "x := 1; y := 2;", 0) == (1, "x := 1; y := 2;")
+    assert rule("fname", "x := 1;", 0) == (0, "x := 1;")
+    assert not rule.skip("fname.g")
+
+
+def test_line_suppressions_both_markers():
+    # "disable=" takes precedence over "disable(nextline)=" in the same line
+    init = getattr(gaplint, "__init_file_and_line_suppressions")
+    init(
+        "fname",
+        [
+            "x := 1;",
+            "x := 1;  # gaplint: disable(nextline)=W016 # gaplint: disable=W004",
+        ],
+    )
+    assert gaplint._LINE_SUPPRESSIONS.pop("fname") == {2: {"W004"}}
+
+
 def test_AnalyseLVars():
     rule = gaplint.AnalyseLVars("W999", "test-rule")
 
@@ -236,6 +306,19 @@ def test_AnalyseLVars():
     # end without function
     with pytest.raises(SystemExit):
         rule("fname", "end;", 0)
+    rule.reset()
+
+    # identifiers starting with keywords
+    assert rule("fname", "endless := 1;", 0)[0] == 0
+    rule.reset()
+    assert (
+        rule(
+            "fname",
+            "f := function(x) localVar := x; return localVar; end;",
+            0,
+        )[0]
+        == 0
+    )
 
 
 def test_run_gaplint():